@@ -11,7 +11,7 @@ from homeassistant.exceptions import ServiceValidationError
 from homeassistant.helpers.typing import ConfigType
 
 from .const import DOMAIN
-from .helpers import async_process_audio_data, async_transcode_from_path
+from .helpers import async_process_audio_data, async_resolve_stt, async_transcode
 from .telegram import TelegramBotManager
 
 _LOGGER = logging.getLogger(__name__)
@@ -36,8 +36,9 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         if not stt_entity_id:
             raise ServiceValidationError("'entity_id' is required.")
 
-        audio_data = await async_transcode_from_path(file_path)
-        return await async_process_audio_data(hass, stt_entity_id, language, audio_data)
+        stt_provider, metadata = async_resolve_stt(hass, stt_entity_id, language)
+        audio_stream = await async_transcode(hass, file_path)
+        return await async_process_audio_data(stt_provider, metadata, audio_stream)
 
     hass.services.async_register(
         DOMAIN, "recognize_file", handle_recognize_file_service,
@@ -23,6 +23,43 @@ from .const import (
     CONF_TELEGRAM_SEND_REPLY,
     # --- ИМПОРТИРУЕМ НОВУЮ КОНСТАНТУ ---
     CONF_TELEGRAM_MAX_DURATION,
+    CONF_TELEGRAM_MAX_PARALLEL,
+    DEFAULT_TELEGRAM_MAX_PARALLEL,
+)
+
+OPTIONS_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_TELEGRAM_ENABLED, default=False): bool,
+        vol.Required(CONF_TELEGRAM_SEND_REPLY, default=True): bool,
+        vol.Optional(
+            CONF_TELEGRAM_MAX_DURATION,
+            # По умолчанию 180 секунд (3 минуты). 0 - без лимита.
+            default=180,
+        ): selector.NumberSelector(
+            selector.NumberSelectorConfig(
+                min=0,
+                max=3600, # Лимит в 1 час, чтобы избежать случайных огромных значений
+                step=1,
+                mode="box",
+                unit_of_measurement="seconds",
+            )
+        ),
+        vol.Optional(
+            CONF_TELEGRAM_MAX_PARALLEL, default=DEFAULT_TELEGRAM_MAX_PARALLEL
+        ): selector.NumberSelector(
+            selector.NumberSelectorConfig(
+                min=1,
+                max=10,
+                step=1,
+                mode="box",
+            )
+        ),
+        vol.Optional(CONF_TELEGRAM_BOT_TOKEN): str,
+        vol.Optional(CONF_TELEGRAM_CHAT_IDS): str,
+        vol.Optional(CONF_TELEGRAM_STT_ENTITY_ID): selector.EntitySelector(
+            selector.EntitySelectorConfig(domain="stt")
+        ),
+    }
 )
 
 
@@ -61,47 +98,5 @@ class AudioRecognizerOptionsFlow(OptionsFlowWithConfigEntry):
         if user_input is not None:
             return self.async_create_entry(title="", data=user_input)
 
-        schema = vol.Schema(
-            {
-                vol.Required(
-                    CONF_TELEGRAM_ENABLED,
-                    default=self.options.get(CONF_TELEGRAM_ENABLED, False),
-                ): bool,
-                vol.Required(
-                    CONF_TELEGRAM_SEND_REPLY,
-                    default=self.options.get(CONF_TELEGRAM_SEND_REPLY, True),
-                ): bool,
-                # --- ДОБАВЛЯЕМ НОВЫЙ ПАРАМЕТР В СХЕМУ ---
-                vol.Optional(
-                    CONF_TELEGRAM_MAX_DURATION,
-                    # По умолчанию 180 секунд (3 минуты). 0 - без лимита.
-                    default=self.options.get(CONF_TELEGRAM_MAX_DURATION, 180),
-                ): selector.NumberSelector(
-                    selector.NumberSelectorConfig(
-                        min=0,
-                        max=3600, # Лимит в 1 час, чтобы избежать случайных огромных значений
-                        step=1,
-                        mode="box",
-                        unit_of_measurement="seconds",
-                    )
-                ),
-                vol.Optional(
-                    CONF_TELEGRAM_BOT_TOKEN,
-                    description={"suggested_value": self.options.get(CONF_TELEGRAM_BOT_TOKEN)},
-                ): str,
-                vol.Optional(
-                    CONF_TELEGRAM_CHAT_IDS,
-                    description={"suggested_value": self.options.get(CONF_TELEGRAM_CHAT_IDS)},
-                ): str,
-                vol.Optional(
-                    CONF_TELEGRAM_STT_ENTITY_ID,
-                    description={"suggested_value": self.options.get(CONF_TELEGRAM_STT_ENTITY_ID)},
-                ): selector.selector({
-                    "entity": {
-                        "domain": "stt"
-                    }
-                }),
-            }
-        )
-
+        schema = self.add_suggested_values_to_schema(OPTIONS_SCHEMA, self.options)
         return self.async_show_form(step_id="init", data_schema=schema)
\ No newline at end of file
@@ -8,5 +8,9 @@ CONF_TELEGRAM_STT_ENTITY_ID = "telegram_stt_entity_id"
 
 CONF_TELEGRAM_SEND_REPLY = "telegram_send_reply"
 CONF_TELEGRAM_MAX_DURATION = "telegram_max_duration"
+CONF_TELEGRAM_MAX_PARALLEL = "telegram_max_parallel"
+DEFAULT_TELEGRAM_MAX_PARALLEL = 3
+# Bot API getFile refuses anything larger, so don't even try to download it.
+TELEGRAM_MAX_FILE_SIZE = 20 * 1024 * 1024
 EVENT_TRANSCRIPTION_RECEIVED = "audio_recognizer_transcription"
 EVENT_TEXT_RECEIVED = "audio_recognizer_text_received"
\ No newline at end of file
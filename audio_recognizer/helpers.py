@@ -1,9 +1,18 @@
 """Helper functions for the Audio Recognizer integration."""
 import asyncio
+import dataclasses
+import hashlib
 import io
 import logging
-from collections.abc import AsyncIterable
-from typing import Any
+import os
+import threading
+import wave
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Callable, Hashable
+from contextlib import aclosing
+from functools import lru_cache, partial
+from itertools import chain
+from typing import Any, BinaryIO
 
 from homeassistant.components import stt
 from homeassistant.core import HomeAssistant
@@ -12,82 +21,468 @@ from homeassistant.util import language as language_util
 
 from .exceptions import NoAudioStreamError
 
+try:
+    import av
+except ImportError:  # PyAV is optional; fall back to the ffmpeg binary
+    av = None
+
 _LOGGER = logging.getLogger(__name__)
 
+PCM_CHUNK_SIZE = 64 * 1024
+STREAM_YIELD_EVERY = 8
+PCM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Longer results (~4 min of 16 kHz PCM16) are streamed without being teed into the cache.
+PCM_CACHE_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+HASH_IN_EXECUTOR_MIN_BYTES = 1024 * 1024
+SNIFF_BYTES = 12
+# PCM blocks an executor thread may produce ahead of the STT provider.
+STREAM_QUEUE_MAX_CHUNKS = 4
+# How often a producer blocked on a full queue checks whether the consumer went away.
+STREAM_EMIT_POLL_SECONDS = 0.5
+# Containers whose header fully describes the audio stream, so probing can be skipped.
+FAST_PROBE_FORMATS = frozenset({"ogg", "wav"})
+
+FFMPEG_BINARY = "ffmpeg"
+# Raw s16le, 16 kHz, mono: the format described by _METADATA_BASE.
+FFMPEG_OUTPUT_ARGS = ("-vn", "-f", "s16le", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", "-")
+
+
+class _PcmCache:
+    """Size-capped LRU cache of transcoded PCM keyed by the source identity."""
+
+    def __init__(self, max_bytes: int) -> None:
+        """Initialize the cache."""
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._entries: OrderedDict[Hashable, bytes] = OrderedDict()
+
+    def get(self, key: Hashable) -> bytes | None:
+        """Return cached PCM for the key and mark it as recently used."""
+        pcm = self._entries.get(key)
+        if pcm is not None:
+            self._entries.move_to_end(key)
+        return pcm
+
+    def put(self, key: Hashable, pcm: bytes) -> None:
+        """Store PCM for the key, evicting the least recently used entries."""
+        if len(pcm) > self._max_bytes:
+            return
+        if (old := self._entries.pop(key, None)) is not None:
+            self._size -= len(old)
+        self._entries[key] = pcm
+        self._size += len(pcm)
+        while self._size > self._max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+
+_PCM_CACHE = _PcmCache(PCM_CACHE_MAX_BYTES)
+
+# Everything except the language is fixed by the transcoders' output format.
+# stt.AudioFormats has no raw variant: WAV + PCM is what Assist pipelines send for
+# headerless 16-bit PCM, so providers already expect samples without a RIFF header.
+_METADATA_BASE = stt.SpeechMetadata(
+    language="", format=stt.AudioFormats.WAV, codec=stt.AudioCodecs.PCM,
+    bit_rate=stt.AudioBitRates.BITRATE_16, sample_rate=stt.AudioSampleRates.SAMPLERATE_16000,
+    channel=stt.AudioChannels.CHANNEL_MONO
+)
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only file over a bytes-like object.
+
+    io.BytesIO only shares immutable bytes; a bytearray or memoryview would be copied whole.
+    """
+
+    def __init__(self, data: bytes | bytearray | memoryview) -> None:
+        """Initialize the reader."""
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        """Return True, the buffer can always be read."""
+        return True
+
+    def seekable(self) -> bool:
+        """Return True, the buffer supports random access."""
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        """Return up to size bytes from the current position, copying them once."""
+        end = len(self._view) if size is None or size < 0 else self._position + size
+        chunk = self._view[self._position:end].tobytes()
+        self._position += len(chunk)
+        return chunk
+
+    def readinto(self, buffer) -> int:
+        """Copy bytes at the current position into the buffer and advance past them."""
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Move to a new position and return it."""
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"invalid whence ({whence}, should be 0, 1 or 2)")
+        self._position = max(offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        """Return the current position."""
+        return self._position
+
+
+def _sniff_format(header: bytes) -> str | None:
+    """Guesses the container format from the leading magic bytes of a media source."""
+    if header.startswith(b"OggS"):
+        return "ogg"
+    if header.startswith(b"RIFF") and header[8:12] == b"WAVE":
+        return "wav"
+    if header.startswith(b"fLaC"):
+        return "flac"
+    # A leading ID3v2 tag may front MP3, ADTS AAC or FLAC alike, so only a bare
+    # MPEG frame sync pins mp3; tagged sources are left to ffmpeg's probing.
+    if header[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "mp3"
+    return None
+
+
+def _pcm_wav_span(file: BinaryIO) -> tuple[int, int] | None:
+    """Locates the samples of a WAV file that already holds 16 kHz mono PCM16.
+
+    Returns the offset and length of the data chunk, or None if the file needs decoding.
+    """
+    try:
+        with wave.open(file) as wav:
+            if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (16000, 1, 2):
+                return None
+            # wave stops right after the data chunk header, so this is where samples start.
+            data_offset = file.tell()
+            data_size = wav.getnframes() * 2
+    except (wave.Error, EOFError):
+        return None
+    if data_size == 0:
+        return None
+    return data_offset, data_size
+
+
+def _read_pcm_span(
+    source_path: str,
+    span: tuple[int, int],
+    emit: Callable[[bytes], None],
+    cancelled: threading.Event,
+) -> None:
+    """Reads a span of raw PCM from a file in chunks."""
+    # Plain reads rather than mmap: a file truncated while a mapping is being
+    # streamed raises SIGBUS and would take down the whole process.
+    offset, remaining = span
+    with open(source_path, "rb") as file:
+        file.seek(offset)
+        while remaining > 0 and not cancelled.is_set():
+            chunk = file.read(min(PCM_CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            emit(chunk)
+
+
+def _probe_file(source_path: str) -> tuple[os.stat_result, str | None, tuple[int, int] | None]:
+    """Stats and sniffs an audio file, locating its samples if it is already target PCM.
+
+    Everything that touches the disk before decoding happens here, in a single executor job.
+    """
+    with open(source_path, "rb") as file:
+        stat = os.fstat(file.fileno())
+        input_format = _sniff_format(file.read(SNIFF_BYTES))
+        pcm_span = None
+        if input_format == "wav":
+            file.seek(0)
+            pcm_span = _pcm_wav_span(file)
+    return stat, input_format, pcm_span
+
+
+def _demuxer_options(input_format: str | None) -> dict[str, str]:
+    """Returns demuxer options that skip stream probing when the header is self-describing."""
+    if input_format in FAST_PROBE_FORMATS:
+        return {"probesize": "32", "analyzeduration": "0"}
+    return {}
+
+
+def _ffmpeg_input_args(input_format: str | None) -> tuple[str, ...]:
+    """Returns the ffmpeg arguments that pin the input format, if it is known."""
+    if input_format is None:
+        return ()
+    args = ("-f", input_format)
+    for option, value in _demuxer_options(input_format).items():
+        args += (f"-{option}", value)
+    return args
+
+
+def _decode_with_av(
+    source: str | BinaryIO,
+    input_format: str | None,
+    emit: Callable[[bytes], None],
+    cancelled: threading.Event,
+) -> None:
+    """Decodes the first audio stream of a media source to raw PCM chunks in-process."""
+    with av.open(
+        source, format=input_format, container_options=_demuxer_options(input_format)
+    ) as container:
+        if not container.streams.audio:
+            raise NoAudioStreamError("The source media does not contain an audio stream.")
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=16000)
+        pcm = bytearray()
+        for frame in chain(container.decode(audio=0), (None,)):
+            if cancelled.is_set():
+                return
+            for out_frame in resampler.resample(frame):
+                pcm += memoryview(out_frame.planes[0])[: out_frame.samples * 2]
+            if len(pcm) >= PCM_CHUNK_SIZE:
+                emit(bytes(pcm))
+                pcm.clear()
+        if pcm:
+            emit(bytes(pcm))
+
+
+async def _async_executor_stream(
+    hass: HomeAssistant, produce: Callable[[Callable[[bytes], None], threading.Event], None]
+) -> AsyncGenerator[bytes, None]:
+    """Runs a blocking PCM producer in the executor and yields its chunks as they are produced."""
+    queue: asyncio.Queue[bytes | Exception | None] = asyncio.Queue(maxsize=STREAM_QUEUE_MAX_CHUNKS)
+    cancelled = threading.Event()
+
+    def emit(item: bytes | Exception | None) -> None:
+        # Blocks the producer thread while the queue is full, so it runs at most a few
+        # blocks ahead of the STT provider, and gives up once the consumer is gone.
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), hass.loop)
+        while not cancelled.is_set():
+            try:
+                future.result(timeout=STREAM_EMIT_POLL_SECONDS)
+                return
+            except TimeoutError:
+                continue
+        future.cancel()
 
-async def async_transcode_from_bytes(source_data: bytes) -> bytes:
-    """Transcodes an audio file FROM A BYTE ARRAY to raw PCM bytes."""
-    command = ["ffmpeg", "-i", "-", "-vn", "-f", "wav", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", "-"]
+    def run() -> None:
+        try:
+            produce(emit, cancelled)
+        except Exception as err:  # handed over to the consuming coroutine
+            emit(err)
+        else:
+            emit(None)
+
+    hass.async_add_executor_job(run)
+    try:
+        while (item := await queue.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+
+async def _async_feed_stdin(stdin: asyncio.StreamWriter, source_data: bytes | bytearray | memoryview) -> None:
+    """Writes the source media into ffmpeg's stdin in chunks and closes it."""
+    view = memoryview(source_data)
+    try:
+        # Writing chunk by chunk with drain() keeps the transport from buffering a copy of the whole blob.
+        for offset in range(0, len(view), PCM_CHUNK_SIZE):
+            stdin.write(view[offset:offset + PCM_CHUNK_SIZE])
+            await stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # ffmpeg exited before consuming everything; its return code reports why.
+        pass
+    finally:
+        stdin.close()
+
+
+async def _async_ffmpeg_stream(
+    command: tuple[str, ...],
+    source_description: str,
+    source_data: bytes | bytearray | memoryview | None = None,
+) -> AsyncGenerator[bytes, None]:
+    """Runs ffmpeg and yields raw PCM chunks from its stdout as they are produced."""
     process = await asyncio.create_subprocess_exec(
-        *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        *command,
+        stdin=asyncio.subprocess.PIPE if source_data is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
     )
-    stdout_data, stderr_data = await process.communicate(input=source_data)
+    # Feed stdin and drain stderr concurrently so ffmpeg never blocks on a full pipe.
+    feed_task = None
+    if source_data is not None:
+        feed_task = asyncio.create_task(_async_feed_stdin(process.stdin, source_data))
+    stderr_task = asyncio.create_task(process.stderr.read())
+    try:
+        while chunk := await process.stdout.read(PCM_CHUNK_SIZE):
+            yield chunk
+        await process.wait()
+        stderr_data = await stderr_task
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        if feed_task is not None:
+            feed_task.cancel()
+        stderr_task.cancel()
+
     if process.returncode != 0:
         error_msg = stderr_data.decode(errors='ignore')
-        _LOGGER.error("FFmpeg (from bytes) failed with code %s: %s", process.returncode, error_msg)
-        raise ServiceValidationError(f"Failed to transcode in-memory audio. Error: {error_msg}")
-    
-    wav_header_size = 44
-    if len(stdout_data) > wav_header_size:
-        return stdout_data[wav_header_size:]
-    
-    _LOGGER.warning("Transcoding from bytes resulted in empty audio data. The source likely has no audio stream.")
-    raise NoAudioStreamError("The source media does not contain an audio stream.")
+        _LOGGER.error("FFmpeg failed on %s with code %s: %s", source_description, process.returncode, error_msg)
+        raise ServiceValidationError(f"Failed to transcode {source_description}. Error: {error_msg}")
 
 
-async def _async_stream_from_bytes(data: bytes, chunk_size: int = 4096) -> AsyncIterable[bytes]:
-    buffer = io.BytesIO(data)
-    while chunk := buffer.read(chunk_size):
-        yield chunk
-        await asyncio.sleep(0)
+async def _async_cache_stream(
+    cache_key: Hashable, stream: AsyncGenerator[bytes, None]
+) -> AsyncGenerator[bytes, None]:
+    """Passes PCM chunks through and caches the full payload once the stream completes."""
+    # Keep references to the chunks and join them once at the end instead of growing a copy.
+    chunks: list[bytes] | None = []
+    size = 0
+    async with aclosing(stream):
+        async for chunk in stream:
+            if chunks is not None:
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > PCM_CACHE_MAX_ENTRY_BYTES:
+                    chunks = None
+            yield chunk
+    if chunks:
+        _PCM_CACHE.put(cache_key, b"".join(chunks))
 
 
-async def async_transcode_from_path(source_path: str) -> bytes:
-    """Transcodes an audio file FROM A DISK PATH to raw PCM bytes."""
-    command = ["ffmpeg", "-i", str(source_path), "-vn", "-f", "wav", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", "-"]
-    process = await asyncio.create_subprocess_exec(
-        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+async def _async_prime_stream(stream: AsyncGenerator[bytes, None]) -> AsyncGenerator[bytes, None]:
+    """Waits for the first PCM chunk so transcoding errors surface before STT starts."""
+    first_chunk = await anext(stream, None)
+    if first_chunk is None:
+        _LOGGER.warning("Transcoding resulted in empty audio data. The source likely has no audio stream.")
+        raise NoAudioStreamError("The source file does not contain an audio stream.")
+
+    async def _async_chain() -> AsyncGenerator[bytes, None]:
+        async with aclosing(stream):
+            yield first_chunk
+            async for chunk in stream:
+                yield chunk
+
+    return _async_chain()
+
+
+async def _async_decode(
+    hass: HomeAssistant,
+    cache_key: Hashable,
+    input_format: str | None,
+    source: bytes | bytearray | memoryview | str,
+    source_description: str,
+) -> AsyncGenerator[bytes, None]:
+    """Decodes a source with PyAV, falling back to the ffmpeg binary if PyAV is missing or fails."""
+    if isinstance(source, str):
+        ffmpeg_input, source_data = source, None
+    else:
+        ffmpeg_input, source_data = "-", source
+
+    if av is not None:
+        av_source = source if source_data is None else _BufferReader(source_data)
+        try:
+            av_stream = _async_executor_stream(hass, partial(_decode_with_av, av_source, input_format))
+            return await _async_prime_stream(_async_cache_stream(cache_key, av_stream))
+        except av.error.FFmpegError as err:
+            _LOGGER.warning("PyAV failed to decode %s, retrying with ffmpeg: %s", source_description, err)
+
+    command = (FFMPEG_BINARY, *_ffmpeg_input_args(input_format), "-i", ffmpeg_input, *FFMPEG_OUTPUT_ARGS)
+    return await _async_prime_stream(
+        _async_cache_stream(cache_key, _async_ffmpeg_stream(command, source_description, source_data))
     )
-    stdout_data, stderr_data = await process.communicate()
 
-    if process.returncode != 0:
-        error_msg = stderr_data.decode(errors='ignore')
-        _LOGGER.error("FFmpeg (from path) failed with code %s: %s", process.returncode, error_msg)
-        raise ServiceValidationError(f"Failed to transcode audio file: {source_path}. Error: {error_msg}")
-    
-    wav_header_size = 44
-    if len(stdout_data) > wav_header_size:
-        return stdout_data[wav_header_size:]
-    
-    _LOGGER.warning("Transcoding from path resulted in empty audio data. The source likely has no audio stream.")
-    raise NoAudioStreamError("The source file does not contain an audio stream.")
 
+def _source_digest(source_data: bytes | bytearray | memoryview) -> bytes:
+    """Returns the cache digest of in-memory media (OpenSSL SHA-256, truncated to 128 bits)."""
+    return hashlib.sha256(source_data).digest()[:16]
 
-async def async_process_audio_data(
-    hass: HomeAssistant, stt_entity_id: str, language: str | None, audio_data: bytes
-) -> dict[str, Any]:
-    """Processes raw PCM audio data using an STT provider."""
+
+async def _async_stream_from_bytes(
+    data: bytes, chunk_size: int = PCM_CHUNK_SIZE
+) -> AsyncGenerator[memoryview, None]:
+    view = memoryview(data)
+    for chunks_sent, offset in enumerate(range(0, len(view), chunk_size), start=1):
+        yield view[offset:offset + chunk_size]
+        # Hand control back to the loop only every few chunks, not after each one.
+        if chunks_sent % STREAM_YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+
+
+async def async_transcode(
+    hass: HomeAssistant, source: bytes | bytearray | memoryview | str | os.PathLike[str]
+) -> AsyncGenerator[bytes, None]:
+    """Transcodes audio from a disk path or an in-memory buffer to a stream of raw PCM chunks."""
+    if isinstance(source, (str, os.PathLike)):
+        source_path = os.fspath(source)
+        try:
+            stat, input_format, pcm_span = await hass.async_add_executor_job(_probe_file, source_path)
+        except OSError as err:
+            raise ServiceValidationError(f"Cannot access audio file: {source_path}. Error: {err}") from err
+        if pcm_span is not None:
+            _LOGGER.debug("%s is already 16 kHz mono PCM, streaming it without transcoding", source_path)
+            return _async_executor_stream(hass, partial(_read_pcm_span, source_path, pcm_span))
+        cache_key: Hashable = ("path", source_path, stat.st_mtime_ns, stat.st_size)
+        source_description = f"audio file: {source_path}"
+        source = source_path
+    else:
+        if len(source) >= HASH_IN_EXECUTOR_MIN_BYTES:
+            digest = await hass.async_add_executor_job(_source_digest, source)
+        else:
+            digest = _source_digest(source)
+        cache_key = ("bytes", digest)
+        source_description = "in-memory audio"
+        input_format = _sniff_format(bytes(source[:SNIFF_BYTES]))
+
+    if (pcm := _PCM_CACHE.get(cache_key)) is not None:
+        _LOGGER.debug("Using cached PCM for %s", source_description)
+        return _async_stream_from_bytes(pcm)
+
+    return await _async_decode(hass, cache_key, input_format, source, source_description)
+
+
+@lru_cache(maxsize=64)
+def _resolve_language(
+    language: str | None, system_language: str, supported_languages: tuple[str, ...]
+) -> str | None:
+    """Resolves the recognition language, or returns None if it is not supported."""
+    target_language = language or system_language
+    if language_util.matches(target_language, supported_languages):
+        return target_language
+    if language is None and supported_languages:
+        _LOGGER.warning("Language '%s' not supported, falling back to first available: %s", target_language, supported_languages[0])
+        return supported_languages[0]
+    return None
+
+
+def async_resolve_stt(
+    hass: HomeAssistant, stt_entity_id: str, language: str | None
+) -> tuple[stt.SpeechToTextEntity, stt.SpeechMetadata]:
+    """Looks up the STT provider and builds its metadata; call this before transcoding."""
     stt_provider = stt.async_get_speech_to_text_entity(hass, stt_entity_id)
     if stt_provider is None: raise ServiceValidationError(f"STT provider '{stt_entity_id}' not found.")
     
-    target_language = language or hass.config.language
-    supported_languages = stt_provider.supported_languages
-    if not language_util.matches(target_language, supported_languages):
-         if language is None and supported_languages:
-             _LOGGER.warning("Language '%s' not supported, falling back to first available: %s", target_language, supported_languages[0])
-             target_language = supported_languages[0]
-         else: raise ServiceValidationError(f"Language '{target_language}' is not supported by {stt_entity_id}.")
-
-    metadata = stt.SpeechMetadata(
-        language=target_language, format=stt.AudioFormats.WAV, codec=stt.AudioCodecs.PCM,
-        bit_rate=stt.AudioBitRates.BITRATE_16, sample_rate=stt.AudioSampleRates.SAMPLERATE_16000,
-        channel=stt.AudioChannels.CHANNEL_MONO
-    )
-    
+    target_language = _resolve_language(language, hass.config.language, tuple(stt_provider.supported_languages))
+    if target_language is None:
+        raise ServiceValidationError(f"Language '{language or hass.config.language}' is not supported by {stt_entity_id}.")
+
+    return stt_provider, dataclasses.replace(_METADATA_BASE, language=target_language)
+
+
+async def async_process_audio_data(
+    stt_provider: stt.SpeechToTextEntity, metadata: stt.SpeechMetadata, audio_stream: AsyncGenerator[bytes, None]
+) -> dict[str, Any]:
+    """Processes a stream of raw PCM audio using an STT provider."""
     try:
-        audio_stream = _async_stream_from_bytes(audio_data)
-        _LOGGER.info("Starting recognition with '%s'...", stt_entity_id)
-        result = await stt_provider.internal_async_process_audio_stream(metadata, audio_stream)
+        _LOGGER.info("Starting recognition with '%s'...", stt_provider.entity_id)
+        # Closing the stream stops the decoder even if the provider did not read it to the end.
+        async with aclosing(audio_stream):
+            result = await stt_provider.internal_async_process_audio_stream(metadata, audio_stream)
         
         if result.result == stt.SpeechResultState.SUCCESS:
             _LOGGER.info("Recognition successful! Text: '%s'", result.text)
@@ -95,6 +490,10 @@ async def async_process_audio_data(
         
         raise ServiceValidationError(f"Recognition failed. Result state: {result.result}")
 
+    except (ServiceValidationError, NoAudioStreamError) as e:
+        # Expected failures (bad result state, transcoding errors): no traceback needed.
+        _LOGGER.error("STT processing failed: %s", e)
+        raise
     except Exception as e:
         _LOGGER.error("An unexpected error during STT processing: %s", e, exc_info=True)
         raise ServiceValidationError("An unexpected error occurred during STT processing.")
\ No newline at end of file
@@ -1,27 +1,48 @@
 """Telegram bot functionality for the Audio Recognizer integration."""
+import asyncio
 import logging
+from typing import Any
 
+import orjson
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ServiceValidationError
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import Application, CallbackContext, MessageHandler, filters
+from telegram.request import HTTPXRequest
 
 from .const import (
     CONF_TELEGRAM_BOT_TOKEN,
     CONF_TELEGRAM_CHAT_IDS,
     CONF_TELEGRAM_ENABLED,
     CONF_TELEGRAM_MAX_DURATION,
+    CONF_TELEGRAM_MAX_PARALLEL,
     CONF_TELEGRAM_SEND_REPLY,
     CONF_TELEGRAM_STT_ENTITY_ID,
+    DEFAULT_TELEGRAM_MAX_PARALLEL,
     EVENT_TRANSCRIPTION_RECEIVED,
     EVENT_TEXT_RECEIVED,
+    TELEGRAM_MAX_FILE_SIZE,
 )
 from .exceptions import NoAudioStreamError
-from .helpers import async_process_audio_data, async_transcode_from_bytes
+from .helpers import async_process_audio_data, async_resolve_stt, async_transcode
 
 _LOGGER = logging.getLogger(__name__)
 
 
+class _OrjsonHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that parses Telegram's responses with orjson instead of json."""
+
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> dict[str, Any]:
+        """Parse the JSON returned from Telegram."""
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError as exc:
+            raise TelegramError("Invalid server response") from exc
+
+
 class TelegramBotManager:
     """Manages the Telegram bot lifecycle and message handling."""
 
@@ -29,7 +50,31 @@ class TelegramBotManager:
         """Initialize the bot manager."""
         self.hass = hass
         self.entry = entry
-        self.telegram_app: Application | None = None
+        # Resolves to the running Application once started; None while the bot is stopped.
+        self._ready: asyncio.Future[Application] | None = None
+        self._allowed_ids: frozenset[str] | None = None
+        self._stt_entity_id: str | None = None
+        self._send_reply = True
+        self._max_duration = 180
+        self._refresh_options()
+        # Bounds how many media messages are transcoded and recognized at the same time.
+        self._audio_semaphore = asyncio.Semaphore(
+            int(entry.options.get(CONF_TELEGRAM_MAX_PARALLEL, DEFAULT_TELEGRAM_MAX_PARALLEL))
+        )
+        self._audio_tasks: set[asyncio.Task] = set()
+
+    def _refresh_options(self):
+        """Snapshot the options used on every message, so handlers don't re-read them.
+
+        Saving new options reloads the entry, which builds a new manager.
+        """
+        options = self.entry.options
+        allowed_ids_str = options.get(CONF_TELEGRAM_CHAT_IDS) or ""
+        # None means every chat is allowed.
+        self._allowed_ids = frozenset(s.strip() for s in allowed_ids_str.split(',') if s.strip()) or None
+        self._stt_entity_id = options.get(CONF_TELEGRAM_STT_ENTITY_ID)
+        self._send_reply = bool(options.get(CONF_TELEGRAM_SEND_REPLY, True))
+        self._max_duration = int(options.get(CONF_TELEGRAM_MAX_DURATION, 180))
 
     async def start_bot_if_enabled(self):
         """Start the Telegram bot if it's enabled in the config."""
@@ -43,59 +88,91 @@ class TelegramBotManager:
         _LOGGER.info("Starting Telegram bot...")
 
         def build_app():
-            return Application.builder().token(token).build()
+            return (
+                Application.builder()
+                .token(token)
+                # Same pool sizes PTB uses for its default requests.
+                .request(_OrjsonHTTPXRequest(connection_pool_size=256))
+                .get_updates_request(_OrjsonHTTPXRequest(connection_pool_size=1))
+                .build()
+            )
 
-        self.telegram_app = await self.hass.async_add_executor_job(build_app)
-
-        # Обработчик для аудио
-        media_filters = filters.VOICE | filters.AUDIO | filters.Document.AUDIO
-        self.telegram_app.add_handler(MessageHandler(media_filters, self.handle_audio_message))
+        ready = self._ready = self.hass.loop.create_future()
+        try:
+            app = await self.hass.async_add_executor_job(build_app)
 
-        # Обработчик текста
-        text_filters = (filters.TEXT | filters.FORWARDED) & ~filters.COMMAND
-        self.telegram_app.add_handler(MessageHandler(text_filters, self.handle_text_message))
+            # Обработчик для аудио
+            media_filters = filters.VOICE | filters.AUDIO | filters.Document.AUDIO
+            app.add_handler(MessageHandler(media_filters, self.handle_audio_message))
 
+            # Обработчик текста
+            text_filters = (filters.TEXT | filters.FORWARDED) & ~filters.COMMAND
+            app.add_handler(MessageHandler(text_filters, self.handle_text_message))
 
-        await self.telegram_app.initialize()
-        await self.telegram_app.start()
-        if self.telegram_app.updater:
-            await self.telegram_app.updater.start_polling()
-            _LOGGER.info("Telegram bot started and polling for updates.")
+            await app.initialize()
+            await app.start()
+            if app.updater:
+                # Both handlers only look at new messages; don't have Telegram send anything else.
+                await app.updater.start_polling(allowed_updates=[Update.MESSAGE])
+                _LOGGER.info("Telegram bot started and polling for updates.")
+        except BaseException:
+            ready.cancel()
+            raise
+        if ready.cancelled():
+            # stop_bot ran while we were starting; don't leave the bot polling.
+            await self._async_shutdown_app(app)
+            return
+        ready.set_result(app)
 
     async def stop_bot(self):
         """Stop the Telegram bot if it is running."""
-        if not self.telegram_app:
+        for task in self._audio_tasks:
+            task.cancel()
+        ready, self._ready = self._ready, None
+        if ready is None:
             return
+        if not ready.done() or ready.cancelled():
+            # Never finished starting; wake anyone waiting for it.
+            ready.cancel()
+            return
+        await self._async_shutdown_app(ready.result())
+
+    async def _async_shutdown_app(self, app: Application):
+        """Stop polling and shut down a started Application."""
         _LOGGER.info("Stopping Telegram bot...")
         try:
-            if self.telegram_app.updater and self.telegram_app.updater.running:
-                await self.telegram_app.updater.stop()
-            if self.telegram_app.running:
-                await self.telegram_app.stop()
-            await self.telegram_app.shutdown()
+            if app.updater and app.updater.running:
+                await app.updater.stop()
+            if app.running:
+                await app.stop()
+            await app.shutdown()
             _LOGGER.info("Telegram bot stopped successfully.")
         except Exception as e:
             _LOGGER.error("Error while stopping telegram bot: %s", e)
-        finally:
-            self.telegram_app = None
 
     async def async_send_message(self, chat_id: str, text: str):
         """Send a message to a Telegram chat."""
-        if not self.telegram_app or not self.telegram_app.bot:
+        ready = self._ready
+        if ready is None or ready.cancelled():
             _LOGGER.error("Telegram bot is not available to send a message.")
             return
         try:
-            await self.telegram_app.bot.send_message(chat_id=chat_id, text=text)
+            # Waits for a bot that is still starting instead of failing the call.
+            app = await asyncio.shield(ready)
+        except asyncio.CancelledError:
+            if ready.cancelled():
+                _LOGGER.error("Telegram bot stopped before the message could be sent.")
+                return
+            raise
+        try:
+            await app.bot.send_message(chat_id=chat_id, text=text)
         except Exception as e:
             _LOGGER.error("Failed to send Telegram message to chat_id %s: %s", chat_id, e)
 
     async def handle_text_message(self, update: Update, context: CallbackContext):
         """Handle incoming text and forwarded messages from Telegram."""
         chat_id_str = str(update.message.chat_id)
-        allowed_ids_str = self.entry.options.get(CONF_TELEGRAM_CHAT_IDS, "")
-        allowed_ids = [s.strip() for s in allowed_ids_str.split(',') if s.strip()]
-
-        if allowed_ids and chat_id_str not in allowed_ids:
+        if self._allowed_ids is not None and chat_id_str not in self._allowed_ids:
             _LOGGER.warning("Ignoring text message from unauthorized chat_id: %s", chat_id_str)
             return
 
@@ -114,42 +191,66 @@ class TelegramBotManager:
     async def handle_audio_message(self, update: Update, context: CallbackContext):
         """Handle incoming voice, audio, and audio-document messages from Telegram."""
         chat_id_str = str(update.message.chat_id)
-        allowed_ids_str = self.entry.options.get(CONF_TELEGRAM_CHAT_IDS, "")
-        allowed_ids = [s.strip() for s in allowed_ids_str.split(',') if s.strip()]
-        if allowed_ids and chat_id_str not in allowed_ids:
+        if self._allowed_ids is not None and chat_id_str not in self._allowed_ids:
             _LOGGER.warning("Ignoring message from unauthorized chat_id: %s", chat_id_str)
             return
 
-        stt_entity_id = self.entry.options.get(CONF_TELEGRAM_STT_ENTITY_ID)
-        if not stt_entity_id:
+        if not self._stt_entity_id:
             _LOGGER.error("Telegram received a message, but no STT provider is configured.")
             return
 
-        should_send_reply = self.entry.options.get(CONF_TELEGRAM_SEND_REPLY, True)
+        # Process in the background so a burst of voice notes is handled concurrently
+        # instead of queueing behind each other in the update dispatcher.
+        task = self.hass.async_create_background_task(
+            self._process_audio_message(update, chat_id_str),
+            name="audio_recognizer telegram media",
+        )
+        self._audio_tasks.add(task)
+        task.add_done_callback(self._audio_tasks.discard)
 
+    async def _process_audio_message(self, update: Update, chat_id_str: str):
+        """Download, transcode and recognize a single media message."""
         try:
             media = update.message.voice or update.message.audio or update.message.document
             if not media:
                 return
 
             duration = getattr(media, 'duration', 0)
-            max_duration = self.entry.options.get(CONF_TELEGRAM_MAX_DURATION, 180)
+            max_duration = self._max_duration
             if max_duration > 0 and duration > 0 and duration > max_duration:
                 _LOGGER.warning(
                     "Media file from chat_id %s is too long (%s seconds), limit is %s seconds. Ignoring.",
                     chat_id_str, duration, max_duration
                 )
-                if should_send_reply:
-                    await update.message.reply_text(
+                if self._send_reply:
+                    self._reply_in_background(
+                        update,
                         f"❌ Файл слишком длинный ({duration} сек.). "
                         f"Максимальная длительность: {max_duration} сек."
                     )
                 return
 
-            media_file = await media.get_file()
-            media_data = await media_file.download_as_bytearray()
-            audio_data = await async_transcode_from_bytes(bytes(media_data))
-            result = await async_process_audio_data(self.hass, stt_entity_id, None, audio_data)
+            file_size = getattr(media, 'file_size', None) or 0
+            if file_size > TELEGRAM_MAX_FILE_SIZE:
+                _LOGGER.warning(
+                    "Media file from chat_id %s is too large (%s bytes), limit is %s bytes. Ignoring.",
+                    chat_id_str, file_size, TELEGRAM_MAX_FILE_SIZE
+                )
+                if self._send_reply:
+                    self._reply_in_background(
+                        update,
+                        f"❌ Файл слишком большой ({file_size // (1024 * 1024)} МБ). "
+                        f"Максимальный размер: {TELEGRAM_MAX_FILE_SIZE // (1024 * 1024)} МБ."
+                    )
+                return
+
+            stt_provider, metadata = async_resolve_stt(self.hass, self._stt_entity_id, None)
+            # The download stays under the semaphore so at most max_parallel buffers exist.
+            async with self._audio_semaphore:
+                media_file = await media.get_file()
+                media_data = await media_file.download_as_bytearray()
+                audio_stream = await async_transcode(self.hass, media_data)
+                result = await async_process_audio_data(stt_provider, metadata, audio_stream)
             text = result.get("text")
 
             if text:
@@ -158,17 +259,36 @@ class TelegramBotManager:
                     EVENT_TRANSCRIPTION_RECEIVED,
                     {"text": text, "chat_id": chat_id_str, "username": update.message.from_user.username}
                 )
-                if should_send_reply:
+                if self._send_reply:
                     await update.message.reply_text(f"🗣️: {text}")
             else:
-                if should_send_reply:
-                    await update.message.reply_text("Не удалось распознать речь.")
+                if self._send_reply:
+                    self._reply_in_background(update, "Не удалось распознать речь.")
 
         except NoAudioStreamError:
             _LOGGER.warning("Processing failed because the media file has no audio stream.")
-            if should_send_reply:
-                await update.message.reply_text("❌ Не удалось обработать: медиафайл не содержит звуковой дорожки.")
+            if self._send_reply:
+                self._reply_in_background(update, "❌ Не удалось обработать: медиафайл не содержит звуковой дорожки.")
+        except (ServiceValidationError, TelegramError) as e:
+            _LOGGER.error("Error processing media message: %s", e)
+            if self._send_reply:
+                self._reply_in_background(update, f"Произошла ошибка: {e}")
         except Exception as e:
             _LOGGER.error("Error processing media message: %s", e, exc_info=True)
-            if should_send_reply:
-                await update.message.reply_text(f"Произошла ошибка: {e}")
\ No newline at end of file
+            if self._send_reply:
+                self._reply_in_background(update, f"Произошла ошибка: {e}")
+
+    def _reply_in_background(self, update: Update, text: str):
+        """Reply to a message without waiting for the Telegram API round-trip."""
+        task = self.hass.async_create_background_task(
+            self._async_reply(update, text), name="audio_recognizer telegram reply"
+        )
+        self._audio_tasks.add(task)
+        task.add_done_callback(self._audio_tasks.discard)
+
+    async def _async_reply(self, update: Update, text: str):
+        """Reply to a message, logging instead of raising on failure."""
+        try:
+            await update.message.reply_text(text)
+        except Exception as e:
+            _LOGGER.error("Failed to reply to Telegram chat_id %s: %s", update.message.chat_id, e)
\ No newline at end of file